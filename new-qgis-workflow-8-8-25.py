@@ -1,26 +1,42 @@
 import os
+import sys
 import glob
 import time
 import math
 import concurrent.futures
 import gc
+import functools
+import io
+import hashlib
+import json
+import shutil
+import sqlite3
+import tempfile
+import subprocess
 
 from PyQt5.QtWidgets import QApplication, QFileDialog
 from PyQt5.QtCore import QVariant
 from qgis.core import (
+    QgsApplication,
     QgsVectorLayer,
     QgsProject,
     QgsProcessingFeedback,
     QgsFeature,
+    QgsFeatureSink,
+    QgsFeatureRequest,
+    QgsFields,
     QgsWkbTypes,
     QgsGeometry,
     QgsField,
     QgsCoordinateReferenceSystem,
     QgsCoordinateTransform,
+    QgsSpatialIndex,
+    QgsVectorFileWriter,
     edit,
 )
 import processing
-from PIL import Image, ImageChops
+import numpy as np
+from PIL import Image
 
 # -------------------- CONFIGURATION ----------------------
 JOB_LIST_FILENAME = "geojson_jobs.txt"
@@ -39,15 +55,28 @@ BACKGROUND_COLOR = "rgba(0, 0, 0, 0)"   # transparent
 TILE_FORMAT = 0                         # 0=PNG, 1=JPG
 METATILESIZE = 8                        # was 16
 ANTIALIAS = False                       # big speed win
+TILE_OUTPUT = "directory"               # "directory" = z/x/y.png files, "mbtiles" = one SQLite file per job
+TILE_RENDER_PROCESSES = 1               # >1: render each job in that many headless processes (directory output)
 
 # Blank tile cleanup
 BLANK_TILE_SIZE_BYTES = 1800            # quick size gate for transparent PNGs
 CLEANUP_THREAD_MULTIPLIER = 4
 CLEANUP_CHUNK = 5000
+CLEANUP_MAP_CHUNKSIZE = 64              # tiles per task sent to a cleanup process
+
+# Memory layer copy
+MEM_COPY_BATCH = 10000                  # features per addFeatures() call
+ASSUME_VALID_INPUT = False              # True: skip per-feature validity checks; one fixgeometries pass before dissolve
+MEM_LAYER_FIELDS = None                 # None = copy every source field; or list the fields the styles use
+# get_group_key inputs: always read, in this order
+GROUP_KEY_FIELDS = ("Type", "M", "MN", "B", "K")
 
 # GC cadence
 GC_EVERY_JOBS = 5
 
+# Parallel jobs: each worker is a separate headless QGIS process (Qt/QGIS objects are not thread-safe)
+WORKER_PROCESSES = max(1, (os.cpu_count() or 1) // 2)
+
 class MinimalFeedback(QgsProcessingFeedback):
     def pushInfo(self, info): pass
     def setProgressText(self, text): pass
@@ -90,130 +119,165 @@ def atomic_unlock(lock_path):
     except Exception:
         pass
 
+# The job list is append-only: build_job_list writes "name,PENDING" once, then every state
+# change appends "name,STATUS,timestamp". The last line for a name is its current state.
+def _read_job_states(job_list_path):
+    states = {}
+    with open(job_list_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            fn, rest = line.split(",", 1)
+            states[fn] = rest.split(",", 1)[0]
+    return states
+
+def _append_job_event(job_list_path, fn, status):
+    # One O_APPEND write per event. Callers hold atomic_lock: on Windows the C runtime seeks to the
+    # end and writes as two steps, so concurrent appends could overwrite each other
+    fd = os.open(job_list_path, os.O_WRONLY | os.O_APPEND)
+    try:
+        os.write(fd, f"{fn},{status},{int(time.time())}\n".encode("utf-8"))
+    finally:
+        os.close(fd)
+
 def claim_next_job(main_folder):
     job_list_path = os.path.join(main_folder, JOB_LIST_FILENAME)
     lock_path = atomic_lock(main_folder)
-    claimed_file = None
-    with open(job_list_path, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-    new_lines = []
-    for line in lines:
-        fn, status = line.strip().split(",", 1)
-        if status == JOB_STATUS_PENDING and claimed_file is None:
-            new_lines.append(f"{fn},{JOB_STATUS_IN_PROGRESS}\n")
-            claimed_file = fn
-        else:
-            new_lines.append(line)
-    with open(job_list_path, "w", encoding="utf-8") as f:
-        f.writelines(new_lines)
-    atomic_unlock(lock_path)
+    try:
+        # Lock only covers "pick a pending job + record the claim"
+        claimed_file = None
+        for fn, status in _read_job_states(job_list_path).items():
+            if status == JOB_STATUS_PENDING:
+                claimed_file = fn
+                break
+        if claimed_file:
+            _append_job_event(job_list_path, claimed_file, JOB_STATUS_IN_PROGRESS)
+    finally:
+        atomic_unlock(lock_path)
     return os.path.join(main_folder, claimed_file) if claimed_file else None
 
 def mark_job_done(main_folder, filename):
     job_list_path = os.path.join(main_folder, JOB_LIST_FILENAME)
     lock_path = atomic_lock(main_folder)
-    with open(job_list_path, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-    new_lines = []
-    for line in lines:
-        fn, status = line.strip().split(",", 1)
-        if fn == os.path.basename(filename):
-            new_lines.append(f"{fn},{JOB_STATUS_DONE}\n")
-        else:
-            new_lines.append(line)
-    with open(job_list_path, "w", encoding="utf-8") as f:
-        f.writelines(new_lines)
-    atomic_unlock(lock_path)
+    try:
+        _append_job_event(job_list_path, os.path.basename(filename), JOB_STATUS_DONE)
+    finally:
+        atomic_unlock(lock_path)
 
 def check_all_done(main_folder):
     job_list_path = os.path.join(main_folder, JOB_LIST_FILENAME)
     if not os.path.exists(job_list_path):
         return True
-    with open(job_list_path, "r", encoding="utf-8") as f:
-        for line in f:
-            fn, status = line.strip().split(",", 1)
-            if status != JOB_STATUS_DONE:
-                return False
-    return True
+    return all(status == JOB_STATUS_DONE for status in _read_job_states(job_list_path).values())
 
 # -------------------- MATH / CRS HELPERS ----------------------
-def _lat_to_tile_y(lat, zoom):
+def _lat_to_unit_y(lat):
+    """Web-Mercator y of a latitude in [0, 1]; multiply by 2**zoom and floor for the tile row."""
     rad = math.radians(lat)
-    return math.floor((1 - math.log(math.tan(rad) + 1 / math.cos(rad)) / math.pi) / 2 * (2 ** zoom))
+    return (1 - math.log(math.tan(rad) + 1 / math.cos(rad)) / math.pi) / 2
 
 def compute_total_tiles_wgs84(xmin, xmax, ymin, ymax, zoom_min, zoom_max):
-    total = 0
-    for z in range(zoom_min, zoom_max + 1):
-        txmin = math.floor((xmin + 180) / 360 * (2 ** z))
-        txmax = math.floor((xmax + 180) / 360 * (2 ** z))
-        tymin = _lat_to_tile_y(ymax, z)
-        tymax = _lat_to_tile_y(ymin, z)
-        total += (txmax - txmin + 1) * (tymax - tymin + 1)
-    return total
+    # All zoom levels at once: the projections are zoom-independent, only the scale n changes
+    n = 2.0 ** np.arange(zoom_min, zoom_max + 1)
+    txmin = np.floor((xmin + 180) / 360 * n)
+    txmax = np.floor((xmax + 180) / 360 * n)
+    tymin = np.floor(_lat_to_unit_y(ymax) * n)
+    tymax = np.floor(_lat_to_unit_y(ymin) * n)
+    return int(((txmax - txmin + 1) * (tymax - tymin + 1)).sum())
+
+@functools.lru_cache(maxsize=32)
+def _wgs84_transform(src_authid):
+    """Transforms are keyed by source authid so PROJ pipeline setup happens once per CRS."""
+    src = QgsCoordinateReferenceSystem(src_authid)
+    dst = QgsCoordinateReferenceSystem("EPSG:4326")
+    return QgsCoordinateTransform(src, dst, QgsProject.instance())
 
 def layer_extent_wgs84(layer):
     src = layer.crs()
-    dst = QgsCoordinateReferenceSystem("EPSG:4326")
-    tr = QgsCoordinateTransform(src, dst, QgsProject.instance())
-    e = layer.extent()
-    sw = tr.transform(e.xMinimum(), e.yMinimum())
-    ne = tr.transform(e.xMaximum(), e.yMaximum())
-    xmin, ymin = min(sw.x(), ne.x()), min(sw.y(), ne.y())
-    xmax, ymax = max(sw.x(), ne.x()), max(sw.y(), ne.y())
-    return xmin, xmax, ymin, ymax
+    if src.authid():
+        tr = _wgs84_transform(src.authid())
+    else:
+        # Custom CRS without an authid: nothing stable to cache on
+        tr = QgsCoordinateTransform(src, QgsCoordinateReferenceSystem("EPSG:4326"), QgsProject.instance())
+    # Samples along the edges, not just two corners, so curved/rotated extents stay covered
+    e = tr.transformBoundingBox(layer.extent())
+    return e.xMinimum(), e.xMaximum(), e.yMinimum(), e.yMaximum()
 
 # -------------------- CLEANERS ----------------------
-def clean_outline_layer_batch(layer):
-    """Exterior rings only + batch geometry update (no per-feature edit blocks)."""
-    prov = layer.dataProvider()
-    changes = {}
+def explode_exterior_rings(layer):
+    """One pass over a (multi)polygon layer: one single-part, exterior-ring-only feature per part.
+
+    Replaces native:multiparttosingleparts + a separate ring rewrite, so only one layer is built.
+    """
+    out = QgsVectorLayer(f"Polygon?crs={layer.crs().authid()}", layer.name(), "memory")
+    out.setCrs(layer.crs())  # authid() is empty for custom CRSs
+    prov = out.dataProvider()
+    prov.addAttributes(layer.fields())
+    out.updateFields()
+    out_fields = out.fields()
+
+    new_feats = []
     for feat in layer.getFeatures():
         g = feat.geometry()
         if not g or g.isEmpty():
             continue
-        if not g.isGeosValid():
-            g = g.makeValid()
-
-        if g.isMultipart():
-            parts = g.asMultiPolygon()
-            exteriors = []
-            for poly in parts or []:
-                if poly and len(poly) > 0:
-                    exteriors.append([poly[0]])
-            if exteriors:
-                changes[feat.id()] = QgsGeometry.fromMultiPolygonXY(exteriors)
-        else:
-            poly = g.asPolygon()
+        # No isGeosValid() here: dissolve output is a GEOS union, valid by construction, and these
+        # merged outlines are the most expensive geometries in the job to validate
+
+        attrs = feat.attributes()
+        parts = g.asMultiPolygon() if g.isMultipart() else [g.asPolygon()]
+        for poly in parts or []:
             if poly and len(poly) > 0:
-                changes[feat.id()] = QgsGeometry.fromPolygonXY([poly[0]])
+                nf = QgsFeature(out_fields)
+                nf.setGeometry(QgsGeometry.fromPolygonXY([poly[0]]))
+                nf.setAttributes(attrs)
+                new_feats.append(nf)
 
-    if changes:
-        prov.changeGeometryValues(changes)
+    if new_feats:
+        prov.addFeatures(new_feats, QgsFeatureSink.FastInsert)
+    out.updateExtents()
+    return out
 
-    # Remove contained boundaries within same group_key (fast BB-first)
+def clean_outline_layer_batch(layer):
+    """Drop outlines contained in a larger outline of the same group_key."""
+    # Remove contained boundaries within same group_key (R-tree prefilter + BB-first)
     feats = list(layer.getFeatures())
+    gk_idx = layer.fields().indexFromName("group_key")
     by_group = {}
     for f in feats:
-        by_group.setdefault(f["group_key"], []).append(f)
+        by_group.setdefault(f.attribute(gk_idx), []).append(f)
 
     remove_ids = set()
     for gk, arr in by_group.items():
-        # Sort small→large so we mark small ones quickly
-        arr = sorted(arr, key=lambda f: f.geometry().area())
-        for i, f_small in enumerate(arr):
+        arr = [f for f in arr if not f.geometry().isEmpty()]
+        if len(arr) < 2:
+            continue
+        # Visit large→small: only an outline visited earlier (larger) can contain the current one
+        arr.sort(key=lambda f: f.geometry().area(), reverse=True)
+        # Filled as the sweep goes: only larger outlines that were kept are ever candidates
+        index = QgsSpatialIndex(QgsSpatialIndex.FlagStoreFeatureGeometries)
+        # fid -> (geometry, prepared engine). Containers only match within their own group, so the
+        # cache is per group: engines are built lazily, shared by every query, freed with the group.
+        engines = {}
+        for f_small in arr:
             gs = f_small.geometry()
-            if gs is None:
-                continue
             bb_s = gs.boundingBox()
-            for f_big in arr[i+1:]:
-                gb = f_big.geometry()
-                if gb is None:
-                    continue
+            for fid in index.intersects(bb_s):
+                gb = index.geometry(fid)
                 if not gb.boundingBox().contains(bb_s):
                     continue
-                if gb.contains(gs):
+                if fid not in engines:
+                    engine = QgsGeometry.createGeometryEngine(gb.constGet())
+                    engine.prepareGeometry()
+                    # Keep gb alive alongside: the engine wraps its geometry
+                    engines[fid] = (gb, engine)
+                if engines[fid][1].contains(gs.constGet()):
                     remove_ids.add(f_small.id())
                     break
+            else:
+                # Removed outlines stay out: whatever they contain, their container does too
+                index.addFeature(f_small)
 
     if remove_ids:
         with edit(layer):
@@ -222,62 +286,132 @@ def clean_outline_layer_batch(layer):
         return f"Removed {len(remove_ids)} contained boundaries."
     return "No contained boundaries removed."
 
-def is_blank_tile(tile_path):
+# QGIS encodes every fully transparent tile of a given size to the same bytes, so once one
+# tile has been decoded as blank its digest lets identical tiles skip the PNG decode.
+_BLANK_TILE_DIGESTS = set()
+
+def is_blank_tile(tile_path, check_size=True):
     try:
-        if os.path.getsize(tile_path) > BLANK_TILE_SIZE_BYTES:
+        if check_size and os.path.getsize(tile_path) > BLANK_TILE_SIZE_BYTES:
             return False
+        with open(tile_path, "rb") as f:
+            data = f.read()
+    except Exception:
+        return False
+    return _is_blank_png(data)
+
+def _is_blank_png(data):
+    digest = hashlib.blake2b(data, digest_size=16).digest()
+    if digest in _BLANK_TILE_DIGESTS:
+        return True
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            if img.mode != "RGBA":
+                # Palette+tRNS, LA, RGB...: let PIL expand to RGBA
+                img = img.convert("RGBA")
+            # Only alpha matters for transparent tiles. Scan the contiguous alpha plane as
+            # 8-byte words: one vectorised OR-reduction, 8 pixels per lane.
+            raw = img.getchannel("A").tobytes()
+            blank = not np.frombuffer(raw, dtype=np.uint64 if len(raw) % 8 == 0 else np.uint8).any()
     except Exception:
         return False
+    if blank:
+        _BLANK_TILE_DIGESTS.add(digest)
+    return blank
+
+def clean_mbtiles(mbtiles_path, prefix=""):
+    """Delete blank tiles from an MBTiles file in one transaction (no per-file unlinks)."""
+    con = sqlite3.connect(mbtiles_path)
     try:
-        with Image.open(tile_path) as img:
-            rgba_img = img.convert("RGBA")
-            blank = Image.new("RGBA", rgba_img.size, (0, 0, 0, 0))
-            diff = ImageChops.difference(rgba_img, blank)
-            return diff.getbbox() is None
+        rows = con.execute(
+            "SELECT rowid, tile_data FROM tiles WHERE length(tile_data) <= ?", (BLANK_TILE_SIZE_BYTES,)
+        ).fetchall()
+        print(f"{prefix}Tile cleanup started: {len(rows)} candidate tiles in MBTiles.")
+        blank_rows = [(rowid,) for rowid, data in rows if _is_blank_png(bytes(data))]
+        with con:
+            con.executemany("DELETE FROM tiles WHERE rowid = ?", blank_rows)
+    finally:
+        con.close()
+    print(f"{prefix}Tile cleanup done. {len(blank_rows)} blank tiles deleted.")
+
+def process_tile(p):
+    # clean_tiles only dispatches tiles that already passed the size gate
+    try:
+        if is_blank_tile(p, check_size=False):
+            os.remove(p)
+            return 1
     except Exception:
+        return 0
+    return 0
+
+def _can_use_process_pool():
+    """Pool workers re-import this script: only possible when it runs as a real file under python."""
+    main = sys.modules.get("__main__")
+    main_file = getattr(main, "__file__", None)
+    if not main_file or os.path.abspath(main_file) != os.path.abspath(__file__):
         return False
+    return os.path.basename(sys.executable).lower().startswith("python")
+
+def _cleanup_executor():
+    # PNG decode is CPU-bound and holds the GIL for much of its runtime, so prefer processes.
+    # From the QGIS console the functions can't be pickled; fall back to threads there.
+    if _can_use_process_pool():
+        # Several job workers may be cleaning at once; share the cores between them
+        return concurrent.futures.ProcessPoolExecutor(max_workers=max(1, (os.cpu_count() or 1) // WORKER_PROCESSES))
+    max_workers = min(64, (os.cpu_count() or 1) * CLEANUP_THREAD_MULTIPLIER)
+    return concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+
+def _scan_pngs(directory):
+    """Yield (path, size) for every PNG under directory, in a single scandir pass."""
+    stack = [directory]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.lower().endswith(".png"):
+                    yield entry.path, entry.stat().st_size
 
 def clean_tiles(directory, prefix=""):
+    total = 0
     pngs = []
-    for root, _, files in os.walk(directory):
-        for fn in files:
-            if fn.lower().endswith(".png"):
-                pngs.append(os.path.join(root, fn))
-    if not pngs:
+    for path, size in _scan_pngs(directory):
+        total += 1
+        # Size gate here, so large (never blank) tiles are not even sent to the pool
+        if size <= BLANK_TILE_SIZE_BYTES:
+            pngs.append(path)
+    if not total:
         print(f"{prefix}No PNG tiles found to process.")
         return
 
-    print(f"{prefix}Tile cleanup started: {len(pngs)} PNG files found.")
-    max_workers = min(64, (os.cpu_count() or 1) * CLEANUP_THREAD_MULTIPLIER)
+    print(f"{prefix}Tile cleanup started: {total} PNG files found, {len(pngs)} small enough to be blank.")
     removed = 0
 
-    def process_tile(p):
-        try:
-            if is_blank_tile(p):
-                os.remove(p)
-                return 1
-        except Exception:
-            return 0
-        return 0
-
-    for i in range(0, len(pngs), CLEANUP_CHUNK):
-        batch = pngs[i:i + CLEANUP_CHUNK]
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as ex:
-            for r in ex.map(process_tile, batch):
+    with _cleanup_executor() as ex:
+        for i in range(0, len(pngs), CLEANUP_CHUNK):
+            batch = pngs[i:i + CLEANUP_CHUNK]
+            for r in ex.map(process_tile, batch, chunksize=CLEANUP_MAP_CHUNKSIZE):
                 removed += (r or 0)
 
     print(f"{prefix}Tile cleanup done. {removed} blank tiles deleted.")
 
 # -------------------- GROUP KEY ----------------------
-def get_group_key(feat):
-    def safe_val(field):
-        return feat[field] if field in feat.fields().names() else None
+def get_group_key_factory(fields):
+    """Return get_group_key(feat) for features with this field layout (indices resolved once)."""
+    idx_type, idx_m, idx_mn, idx_b, idx_k = [fields.indexFromName(n) for n in GROUP_KEY_FIELDS]
+
+    def get_group_key(feat):
+        def safe_val(idx):
+            return feat.attribute(idx) if idx != -1 else None
 
-    t = str(safe_val("Type")).strip() if safe_val("Type") is not None else ""
-    m_val = safe_val("M")
-    mn_val = safe_val("MN")
-    b_val = safe_val("B")
-    k_val = safe_val("K")
+        # Keys repeat across many features: intern to share one string per distinct key
+        return sys.intern(_group_key_from_values(
+            safe_val(idx_type), safe_val(idx_m), safe_val(idx_mn), safe_val(idx_b), safe_val(idx_k)))
+
+    return get_group_key
+
+def _group_key_from_values(type_val, m_val, mn_val, b_val, k_val):
+    t = str(type_val).strip() if type_val is not None else ""
 
     def norm(x):
         if x in [None, "", "None"]:
@@ -323,6 +457,7 @@ def get_group_key(feat):
 
 # -------------------- MAIN JOB ----------------------
 def process_geojson(geojson_file):
+    project_layer_ids = []
     try:
         base_name = os.path.splitext(os.path.basename(geojson_file))[0]
         print(f"Processing: {base_name}")
@@ -339,32 +474,52 @@ def process_geojson(geojson_file):
         mem_layer = QgsVectorLayer(f"{geom_type}?crs={crs_authid}", base_name, "memory")
         prov = mem_layer.dataProvider()
 
-        fields = src_layer.fields()
+        src_fields = src_layer.fields()
+        request = QgsFeatureRequest()
+        keep_idx = None
+        if MEM_LAYER_FIELDS is None:
+            fields = src_layer.fields()
+        else:
+            # Only decode (and copy) the attributes the styles use plus the group_key inputs
+            wanted = set(MEM_LAYER_FIELDS) | set(GROUP_KEY_FIELDS)
+            keep_idx = [i for i, name in enumerate(src_fields.names()) if name in wanted]
+            request.setSubsetOfAttributes(keep_idx)
+            fields = QgsFields()
+            for i in keep_idx:
+                fields.append(src_fields.at(i))
         if "group_key" not in fields.names():
             fields.append(QgsField("group_key", QVariant.String))
         prov.addAttributes(fields)
         mem_layer.updateFields()
 
-        gk_idx = mem_layer.fields().indexFromName("group_key")
+        mem_fields = mem_layer.fields()
+        n_mem_fields = mem_fields.count()
+        gk_idx = mem_fields.indexFromName("group_key")
+        get_group_key = get_group_key_factory(src_fields)
+        # Flush in batches so only MEM_COPY_BATCH copies are alive at once, not the whole layer
         new_feats = []
-        for feat in src_layer.getFeatures():
+        for feat in src_layer.getFeatures(request):
             geom = feat.geometry()
-            if geom and not geom.isGeosValid():
+            if not ASSUME_VALID_INPUT and geom and not geom.isGeosValid():
                 geom = geom.makeValid()
-            nf = QgsFeature(mem_layer.fields())
+            nf = QgsFeature(mem_fields)
             nf.setGeometry(geom)
-            attrs = list(feat.attributes())
-            if len(attrs) < mem_layer.fields().count():
-                attrs += [None] * (mem_layer.fields().count() - len(attrs))
+            attrs = feat.attributes()
+            if keep_idx is not None:
+                attrs = [attrs[i] for i in keep_idx]
+            if len(attrs) < n_mem_fields:
+                attrs += [None] * (n_mem_fields - len(attrs))
             attrs[gk_idx] = get_group_key(feat)
             nf.setAttributes(attrs)
             new_feats.append(nf)
-        prov.addFeatures(new_feats)
+            if len(new_feats) >= MEM_COPY_BATCH:
+                prov.addFeatures(new_feats, QgsFeatureSink.FastInsert)
+                new_feats = []
+        if new_feats:
+            prov.addFeatures(new_feats, QgsFeatureSink.FastInsert)
         mem_layer.updateExtents()
         print("Memory layer created.")
 
-        # Add to project ONLY because some QGIS versions need project layers for native:tilesxyzdirectory
-        QgsProject.instance().addMapLayer(mem_layer)
         try:
             tile_style_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tile_style.qml")
             if os.path.exists(tile_style_path):
@@ -373,26 +528,33 @@ def process_geojson(geojson_file):
             pass
         mem_layer.setLabelsEnabled(True)   # labels required
 
-        # Dissolve -> multipart to single -> exterior rings -> label
+        # Dissolve -> single-part exterior rings -> label
         if mem_layer.fields().indexFromName("group_key") == -1:
             print("group_key field missing; skipping dissolve.")
             return
 
+        dissolve_input = mem_layer
+        if ASSUME_VALID_INPUT:
+            # Per-feature checks were skipped: repair the layer once, or dissolve would drop invalid
+            # features (their outlines and labels vanish from the tiles) or abort the job
+            dissolve_input = processing.run(
+                "native:fixgeometries",
+                {"INPUT": mem_layer, "OUTPUT": "memory:"},
+                feedback=MinimalFeedback()
+            )["OUTPUT"]
+
         dissolved = processing.run(
             "native:dissolve",
-            {"INPUT": mem_layer, "FIELD": ["group_key"], "OUTPUT": "memory:"},
+            {"INPUT": dissolve_input, "FIELD": ["group_key"], "OUTPUT": "memory:"},
             feedback=MinimalFeedback()
         )["OUTPUT"]
+        dissolve_input = None
 
-        outline_layer = processing.run(
-            "native:multiparttosingleparts",
-            {"INPUT": dissolved, "OUTPUT": "memory:"},
-            feedback=MinimalFeedback()
-        )["OUTPUT"]
+        outline_layer = explode_exterior_rings(dissolved)
+        dissolved = None  # release the multipart copy before the containment pass
 
         clean_msg = clean_outline_layer_batch(outline_layer)
         print(f"Outline cleaned. {clean_msg}")
-        QgsProject.instance().addMapLayer(outline_layer)
         try:
             murabb_style_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "murabb_style.qml")
             if os.path.exists(murabb_style_path):
@@ -407,16 +569,18 @@ def process_geojson(geojson_file):
         print(f"Tiles to generate: {tiles_est}")
 
         output_dir = os.path.join(os.path.dirname(geojson_file), base_name)
-        os.makedirs(output_dir, exist_ok=True)
-
-        # Prefer qgis:tilesxyzdirectory (supports LAYERS). If not found, fall back to native (project layers).
-        alg_id = "qgis:tilesxyzdirectory"
-        have_qgis_alg = False
+        use_mbtiles = TILE_OUTPUT == "mbtiles"
+        if not use_mbtiles:
+            os.makedirs(output_dir, exist_ok=True)
+
+        # Prefer qgis:tilesxyz*; if not found, fall back to native. Whether the layers can be passed
+        # through LAYERS or must be registered is decided by _alg_takes_layers, not by the id.
+        alg_name = "tilesxyzmbtiles" if use_mbtiles else "tilesxyzdirectory"
+        alg_id = f"qgis:{alg_name}"
         try:
             processing.algorithmHelp(alg_id)
-            have_qgis_alg = True
         except Exception:
-            alg_id = "native:tilesxyzdirectory"
+            alg_id = f"native:{alg_name}"
 
         params = {
             "EXTENT": f"{xmin},{xmax},{ymin},{ymax} [EPSG:4326]",
@@ -430,41 +594,201 @@ def process_geojson(geojson_file):
             "TILE_FORMAT": TILE_FORMAT,
             "QUALITY": 90,
             "METATILESIZE": METATILESIZE,
-            "TMS_CONVENTION": False,
-            "OUTPUT_DIRECTORY": output_dir.replace("\\", "/"),
         }
+        if use_mbtiles:
+            mbtiles_path = output_dir + ".mbtiles"
+            params["OUTPUT_FILE"] = mbtiles_path.replace("\\", "/")
+        else:
+            params["TMS_CONVENTION"] = False
+            params["OUTPUT_DIRECTORY"] = output_dir.replace("\\", "/")
 
-        # Only qgis:* supports explicit LAYERS parameter
-        if have_qgis_alg:
-            params["LAYERS"] = [mem_layer, outline_layer]
+        shards = []
+        if not use_mbtiles and TILE_RENDER_PROCESSES > 1:
+            shards = tile_render_shards(xmin, xmax, ymin, ymax, TILE_RENDER_PROCESSES)
+
+        if len(shards) > 1:
+            render_tiles_sharded(alg_id, params, [mem_layer, outline_layer], shards)
+        else:
+            # An algorithm declaring LAYERS renders unregistered layers directly; otherwise it renders
+            # the project's layer tree, so the layers have to be added to the project.
+            if _alg_takes_layers(alg_id):
+                params["LAYERS"] = [mem_layer, outline_layer]
+            else:
+                for lyr in (mem_layer, outline_layer):
+                    QgsProject.instance().addMapLayer(lyr)
+                    project_layer_ids.append(lyr.id())
 
-        processing.run(alg_id, params, feedback=MinimalFeedback())
+            processing.run(alg_id, params, feedback=MinimalFeedback())
         print(f"Tiles generated for '{base_name}'.")
 
-        clean_tiles(output_dir, prefix=f"{base_name}: ")
+        if use_mbtiles:
+            clean_mbtiles(mbtiles_path, prefix=f"{base_name}: ")
+        else:
+            clean_tiles(output_dir, prefix=f"{base_name}: ")
 
     except Exception:
         print(f"Error processing {geojson_file}")
     finally:
-        # Clean the project to avoid GUI churn between jobs
+        # Drop what this job registered in one call (a single layersRemoved signal)
         try:
-            for l in list(QgsProject.instance().mapLayers().values()):
-                QgsProject.instance().removeMapLayer(l.id())
+            if project_layer_ids:
+                QgsProject.instance().removeMapLayers(project_layer_ids)
         except Exception:
             pass
         gc.collect()
         time.sleep(1)
 
-# ========== MAIN LOOP ==========
-def run():
-    main_folder = select_main_folder()
-    if not main_folder:
-        print("No folder selected. Exiting.")
-        return
+# -------------------- WORKER PROCESSES ----------------------
+def _worker_python():
+    """Interpreter for worker processes (inside QGIS, sys.executable is the QGIS binary)."""
+    exe = os.path.basename(sys.executable).lower()
+    if exe.startswith("python"):
+        return sys.executable
+    if os.name == "nt":
+        return os.path.join(sys.exec_prefix, "python.exe")
+    return os.path.join(sys.exec_prefix, "bin", "python3")
+
+def _worker_env():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in sys.path if p)
+    env.setdefault("QGIS_PREFIX_PATH", QgsApplication.prefixPath())
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    return env
+
+def _start_headless_qgis():
+    QgsApplication.setPrefixPath(os.environ.get("QGIS_PREFIX_PATH", ""), True)
+    qgs = QgsApplication([], False)
+    qgs.initQgis()
+    from processing.core.Processing import Processing
+    Processing.initialize()
+    return qgs
+
+def launch_workers(main_folder, count):
+    """Start `count` headless workers that share this folder's job list."""
+    if count <= 0:
+        return []
+    env = _worker_env()
+    script = os.path.abspath(__file__)
+    procs = []
+    for _ in range(count):
+        procs.append(subprocess.Popen([_worker_python(), script, "--worker", main_folder], env=env))
+    print(f"Started {len(procs)} worker process(es).")
+    return procs
+
+def worker_main(main_folder):
+    """Entry point for a launched worker: boot QGIS headless and drain the job list."""
+    qgs = _start_headless_qgis()
+    try:
+        process_jobs(main_folder)
+    finally:
+        qgs.exitQgis()
+
+# -------------------- SHARDED TILE RENDERING ----------------------
+def _tile_x_to_lon(tx, zoom):
+    return tx / (2 ** zoom) * 360 - 180
+
+def tile_render_shards(xmin, xmax, ymin, ymax, count):
+    """Split the render into (zoom_min, zoom_max, xmin, xmax) shards with disjoint tile sets.
+
+    The deepest zoom holds ~3/4 of all tiles, so zoom ranges alone can't balance the work.
+    From the first zoom wide enough for `count` tile columns upwards, the extent is cut into
+    longitude strips on tile-column edges (an edge at one zoom is an edge at every deeper
+    zoom, so no tile lands in two strips); the cheap zooms below render as one more shard.
+    """
+    for zs in range(ZOOM_MIN, ZOOM_MAX + 1):
+        txmin = math.floor((xmin + 180) / 360 * (2 ** zs))
+        txmax = math.floor((xmax + 180) / 360 * (2 ** zs))
+        if txmax - txmin + 1 >= count:
+            break
+    else:
+        return [(ZOOM_MIN, ZOOM_MAX, xmin, xmax)]
+
+    shards = []
+    if zs > ZOOM_MIN:
+        shards.append((ZOOM_MIN, zs - 1, xmin, xmax))
+    cols = txmax - txmin + 1
+    for i in range(count):
+        c0 = txmin + cols * i // count
+        c1 = txmin + cols * (i + 1) // count      # first column of the next strip
+        sx0 = xmin if i == 0 else _tile_x_to_lon(c0, zs)
+        # Stop just short of the shared edge, which would otherwise select the next column too
+        sx1 = xmax if i == count - 1 else _tile_x_to_lon(c1, zs) - 1e-9
+        shards.append((zs, ZOOM_MAX, sx0, sx1))
+    return shards
+
+def _alg_takes_layers(alg_id):
+    """processing.run silently drops undeclared parameters: only pass LAYERS if the algorithm has it."""
+    alg = QgsApplication.processingRegistry().algorithmById(alg_id)
+    return alg is not None and alg.parameterDefinition("LAYERS") is not None
+
+def render_tiles_sharded(alg_id, params, layers, shards):
+    """Render each shard in its own headless QGIS process, all into the same OUTPUT_DIRECTORY.
+
+    Memory layers can't cross processes, so they go through a temporary GeoPackage plus
+    their current styles (labels included) saved as .qml.
+    """
+    tmp_dir = tempfile.mkdtemp(prefix="tile_shards_")
+    try:
+        gpkg = os.path.join(tmp_dir, "layers.gpkg")
+        layer_specs = []
+        for i, lyr in enumerate(layers):
+            name = f"layer{i}"
+            opts = QgsVectorFileWriter.SaveVectorOptions()
+            opts.driverName = "GPKG"
+            opts.layerName = name
+            if i:
+                opts.actionOnExistingFile = QgsVectorFileWriter.CreateOrOverwriteLayer
+            res = QgsVectorFileWriter.writeAsVectorFormatV3(
+                lyr, gpkg, QgsProject.instance().transformContext(), opts)
+            if res[0] != QgsVectorFileWriter.NoError:
+                raise RuntimeError(f"Could not save {lyr.name()} for shard rendering: {res[1]}")
+            qml = os.path.join(tmp_dir, f"{name}.qml")
+            lyr.saveNamedStyle(qml)
+            layer_specs.append({"uri": f"{gpkg}|layername={name}", "name": lyr.name(), "qml": qml})
+
+        ymin_ymax = params["EXTENT"].split(",", 2)[2]   # "ymin,ymax [EPSG:4326]"
+        env = _worker_env()
+        script = os.path.abspath(__file__)
+        procs = []
+        for n, (zmin, zmax, sx0, sx1) in enumerate(shards):
+            spec = {
+                "alg_id": alg_id,
+                "layers": layer_specs,
+                "params": dict(params, ZOOM_MIN=zmin, ZOOM_MAX=zmax, EXTENT=f"{sx0},{sx1},{ymin_ymax}"),
+            }
+            spec_path = os.path.join(tmp_dir, f"shard{n}.json")
+            with open(spec_path, "w", encoding="utf-8") as f:
+                json.dump(spec, f)
+            procs.append(subprocess.Popen([_worker_python(), script, "--render-shard", spec_path], env=env))
+        failed = sum(1 for proc in procs if proc.wait() != 0)
+        if failed:
+            raise RuntimeError(f"{failed} of {len(procs)} tile render shards failed.")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
 
-    print(f"Selected folder: {main_folder}")
-    build_job_list(main_folder)
+def render_shard_main(spec_path):
+    """Entry point for a render shard: load the saved layers and render one shard."""
+    qgs = _start_headless_qgis()
+    try:
+        with open(spec_path, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+        layers = []
+        for entry in spec["layers"]:
+            lyr = QgsVectorLayer(entry["uri"], entry["name"], "ogr")
+            lyr.loadNamedStyle(entry["qml"])
+            layers.append(lyr)
+        params = spec["params"]
+        if _alg_takes_layers(spec["alg_id"]):
+            params["LAYERS"] = layers
+        else:
+            for lyr in layers:
+                QgsProject.instance().addMapLayer(lyr)
+        processing.run(spec["alg_id"], params, feedback=MinimalFeedback())
+    finally:
+        qgs.exitQgis()
 
+# ========== MAIN LOOP ==========
+def process_jobs(main_folder):
     while not check_all_done(main_folder):
         geojson_file = claim_next_job(main_folder)
         if geojson_file is None:
@@ -475,8 +799,28 @@ def run():
         process_geojson(geojson_file)
         mark_job_done(main_folder, geojson_file)
 
+def run():
+    main_folder = select_main_folder()
+    if not main_folder:
+        print("No folder selected. Exiting.")
+        return
+
+    print(f"Selected folder: {main_folder}")
+    build_job_list(main_folder)
+
+    # This process is one of the workers; the job-list lock keeps claims exclusive
+    workers = launch_workers(main_folder, WORKER_PROCESSES - 1)
+    process_jobs(main_folder)
+    for proc in workers:
+        proc.wait()
+
     print("All GeoJSON files processed.")
 
 
 if __name__ in {"__main__", "__console__"}:
-    run()
+    if "--worker" in sys.argv:
+        worker_main(sys.argv[-1])
+    elif "--render-shard" in sys.argv:
+        render_shard_main(sys.argv[-1])
+    else:
+        run()
@@ -1,32 +1,66 @@
+import io
+import atexit
 import os
+import sys
 import glob
 import time
 import math
+import shutil
+import tempfile
+import functools
+import queue
+import threading
+import subprocess
 import concurrent.futures
-import gc
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 from PyQt5.QtWidgets import QApplication, QFileDialog
 from PyQt5.QtCore import QVariant
 from qgis.core import (
+    QgsApplication,
     QgsVectorLayer,
     QgsProject,
     QgsProcessingFeedback,
-    QgsFeature,
-    QgsWkbTypes,
+    QgsFeatureRequest,
+    QgsRectangle,
     QgsGeometry,
     QgsField,
-    edit,
+    QgsSpatialIndex,
     QgsVectorLayerSimpleLabeling
 )
 import processing
-from PIL import Image, ImageChops
+import numpy as np
+from PIL import Image
 
 # -------------------- CONFIGURATION ----------------------
-JOB_LIST_FILENAME = "geojson_jobs.txt"
+JOB_STATUS_DIRNAME = "geojson_jobs"
 LOCK_FILENAME = "geojson_jobs.lock"
 JOB_STATUS_PENDING = "PENDING"
 JOB_STATUS_IN_PROGRESS = "IN_PROGRESS"
 JOB_STATUS_DONE = "DONE"
+SEQUENTIAL_CLEANUP_MAX_TILES = 256
+CLEANUP_READ_THREADS = 4
+CLEANUP_UNLINK_THREADS = 8
+CLEANUP_QUEUE_SIZE = 256
+CLEANUP_DECODE_BATCH = 32
+# Tile-coverage planning: cells tested per bbox, and the most separate renders worth starting
+COVERAGE_MAX_CELLS = 1024
+COVERAGE_MAX_RUNS = 64
+# Render neighbouring jobs (sharing a tile at BATCH_GRID_ZOOM) in one pass, up to BATCH_MAX_JOBS at a time;
+# shared tiles then show features of every job in the batch; each claim looks at most BATCH_SCAN_LIMIT pending jobs
+BATCH_RENDER_JOBS = False
+BATCH_GRID_ZOOM = 10
+BATCH_MAX_JOBS = 4
+BATCH_SCAN_LIMIT = 64
+# Headless QGIS processes draining the job list together (this one included); tile writes
+# saturate the disk well before the CPU, so more than a handful rarely helps
+WORKER_PROCESSES = min(4, max(1, (os.cpu_count() or 1) // 2))
 
 def select_main_folder():
     app = QApplication.instance()
@@ -36,97 +70,229 @@ def select_main_folder():
     return folder
 
 def build_job_list(main_folder):
-    job_list_path = os.path.join(main_folder, JOB_LIST_FILENAME)
-    if os.path.exists(job_list_path):
-        return
-    files = glob.glob(os.path.join(main_folder, "*.geojson"))
-    with open(job_list_path, "w", encoding="utf-8") as f:
+    # One marker file per job, named "<geojson>.<STATUS>"; state changes are renames
+    status_dir = os.path.join(main_folder, JOB_STATUS_DIRNAME)
+    with jobs_lock(main_folder):
+        if os.path.isdir(status_dir):
+            return
+        os.makedirs(status_dir)
+        files = glob.glob(os.path.join(main_folder, "*.geojson"))
         for file in files:
-            f.write(f"{os.path.basename(file)},{JOB_STATUS_PENDING}\n")
-
-def atomic_lock(folder, timeout=30):
+            extent = ""
+            if BATCH_RENDER_JOBS:
+                # Read once here and kept in the marker (renames carry it along), so batch claims
+                # never have to parse other jobs' GeoJSON
+                layer = QgsVectorLayer(file, os.path.basename(file), "ogr")
+                if layer.isValid():
+                    ext = layer.extent()
+                    extent = f"{ext.xMinimum()},{ext.xMaximum()},{ext.yMinimum()},{ext.yMaximum()}"
+            marker_path = os.path.join(status_dir, f"{os.path.basename(file)}.{JOB_STATUS_PENDING}")
+            with open(marker_path, "w", encoding="utf-8") as f:
+                f.write(extent)
+
+@contextmanager
+def jobs_lock(folder):
+    """Exclusive OS lock on the lock file; the kernel wakes waiters on release and drops it if we crash."""
     lock_path = os.path.join(folder, LOCK_FILENAME)
-    waited = 0
-    while True:
+    with open(lock_path, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    # LK_LOCK gives up after ~10 s of retries; keep waiting like flock does
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
         try:
-            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
-            os.close(fd)
-            return lock_path
-        except FileExistsError:
-            time.sleep(0.25)
-            waited += 0.25
-            if waited >= timeout:
-                print("Timeout waiting for job file lock.")
-                raise Exception("Timeout waiting for job file lock.")
-
-def atomic_unlock(lock_path):
+            yield f
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _set_job_status(main_folder, filename, old_status, new_status):
+    status_dir = os.path.join(main_folder, JOB_STATUS_DIRNAME)
+    fn = os.path.basename(filename)
+    # rename is atomic on POSIX and NTFS: of several workers racing for a job, exactly one wins
     try:
-        os.remove(lock_path)
-    except Exception:
-        pass
+        os.rename(os.path.join(status_dir, f"{fn}.{old_status}"),
+                  os.path.join(status_dir, f"{fn}.{new_status}"))
+        return True
+    except OSError:
+        return False
 
 def claim_next_job(main_folder):
-    job_list_path = os.path.join(main_folder, JOB_LIST_FILENAME)
-    lock_path = atomic_lock(main_folder)
-    claimed_file = None
-    with open(job_list_path, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-    new_lines = []
-    for line in lines:
-        fn, status = line.strip().split(",", 1)
-        if status == JOB_STATUS_PENDING and claimed_file is None:
-            new_lines.append(f"{fn},{JOB_STATUS_IN_PROGRESS}\n")
-            claimed_file = fn
-        else:
-            new_lines.append(line)
-    with open(job_list_path, "w", encoding="utf-8") as f:
-        f.writelines(new_lines)
-    atomic_unlock(lock_path)
-    if claimed_file:
-        return os.path.join(main_folder, claimed_file)
-    else:
+    status_dir = os.path.join(main_folder, JOB_STATUS_DIRNAME)
+    if not os.path.isdir(status_dir):
         return None
+    pending_suffix = f".{JOB_STATUS_PENDING}"
+    with os.scandir(status_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith(pending_suffix):
+                continue
+            fn = entry.name[:-len(pending_suffix)]
+            if _set_job_status(main_folder, fn, JOB_STATUS_PENDING, JOB_STATUS_IN_PROGRESS):
+                return os.path.join(main_folder, fn)
+    return None
 
 def mark_job_done(main_folder, filename):
-    job_list_path = os.path.join(main_folder, JOB_LIST_FILENAME)
-    lock_path = atomic_lock(main_folder)
-    with open(job_list_path, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-    new_lines = []
-    for line in lines:
-        fn, status = line.strip().split(",", 1)
-        if fn == os.path.basename(filename):
-            new_lines.append(f"{fn},{JOB_STATUS_DONE}\n")
-        else:
-            new_lines.append(line)
-    with open(job_list_path, "w", encoding="utf-8") as f:
-        f.writelines(new_lines)
-    atomic_unlock(lock_path)
+    _set_job_status(main_folder, filename, JOB_STATUS_IN_PROGRESS, JOB_STATUS_DONE)
 
 def check_all_done(main_folder):
-    job_list_path = os.path.join(main_folder, JOB_LIST_FILENAME)
-    if not os.path.exists(job_list_path):
+    status_dir = os.path.join(main_folder, JOB_STATUS_DIRNAME)
+    if not os.path.isdir(status_dir):
         return True
-    with open(job_list_path, "r", encoding="utf-8") as f:
-        for line in f:
-            fn, status = line.strip().split(",", 1)
-            if status != JOB_STATUS_DONE:
-                return False
-    return True
+    open_suffixes = (f".{JOB_STATUS_PENDING}", f".{JOB_STATUS_IN_PROGRESS}")
+    with os.scandir(status_dir) as entries:
+        return not any(entry.name.endswith(open_suffixes) for entry in entries)
+
+def _job_tile_range(marker_path):
+    """Tile range at BATCH_GRID_ZOOM of the extent build_job_list stored in a job's marker file
+    (None if it has none)."""
+    try:
+        with open(marker_path, "r", encoding="utf-8") as f:
+            xmin, xmax, ymin, ymax = (float(v) for v in f.read().split(","))
+    except (OSError, ValueError):
+        return None
+    return _tile_range(xmin, xmax, ymin, ymax, BATCH_GRID_ZOOM)
+
+def _ranges_touch(a, b):
+    return a[0] <= b[1] and b[0] <= a[1] and a[2] <= b[3] and b[2] <= a[3]
+
+def claim_job_batch(main_folder):
+    """Claim the next job plus pending jobs sharing a BATCH_GRID_ZOOM tile with the batch, to render together."""
+    first = claim_next_job(main_folder)
+    if first is None:
+        return []
+    batch = [first]
+    status_dir = os.path.join(main_folder, JOB_STATUS_DIRNAME)
+    ranges = [_job_tile_range(os.path.join(status_dir, f"{os.path.basename(first)}.{JOB_STATUS_IN_PROGRESS}"))]
+    if ranges[0] is None:
+        return batch
+    pending_suffix = f".{JOB_STATUS_PENDING}"
+    pending = []
+    with os.scandir(status_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(pending_suffix):
+                pending.append(entry)
+                # Bound the work per claim; jobs further down the list get their own turn
+                if len(pending) >= BATCH_SCAN_LIMIT:
+                    break
+    for entry in pending:
+        if len(batch) >= BATCH_MAX_JOBS:
+            break
+        tile_range = _job_tile_range(entry.path)
+        if tile_range is None or not any(_ranges_touch(tile_range, other) for other in ranges):
+            continue
+        fn = entry.name[:-len(pending_suffix)]
+        if _set_job_status(main_folder, fn, JOB_STATUS_PENDING, JOB_STATUS_IN_PROGRESS):
+            batch.append(os.path.join(main_folder, fn))
+            ranges.append(tile_range)
+    return batch
+
+def _lat_to_unit_y(lat):
+    rad = math.radians(lat)
+    return (1 - math.log(math.tan(rad) + 1/math.cos(rad)) / math.pi) / 2
 
 def compute_total_tiles(xmin, xmax, ymin, ymax, zoom_min, zoom_max):
-    total = 0
-    def lat_to_tile_y(lat, zoom):
-        rad = math.radians(lat)
-        return math.floor((1 - math.log(math.tan(rad) + 1/math.cos(rad)) / math.pi) / 2 * (2**zoom))
+    # lat -> y is zoom-independent up to the 2**z scale: project both edges once, then do all zooms at once
+    n = 2.0 ** np.arange(zoom_min, zoom_max + 1)
+    tile_x_min = np.floor((xmin + 180) / 360 * n)
+    tile_x_max = np.floor((xmax + 180) / 360 * n)
+    tile_y_min = np.floor(_lat_to_unit_y(ymax) * n)
+    tile_y_max = np.floor(_lat_to_unit_y(ymin) * n)
+    return int(((tile_x_max - tile_x_min + 1) * (tile_y_max - tile_y_min + 1)).sum())
+
+def _tile_lon(tx, zoom):
+    return tx / (2 ** zoom) * 360 - 180
+
+def _tile_lat(ty, zoom):
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / (2 ** zoom)))))
+
+def _merge_cells(cells):
+    """Cover a set of (tx, ty) cells with disjoint rectangles (tx0, tx1, ty0, ty1): runs per row, stacked."""
+    rows = {}
+    for tx, ty in cells:
+        rows.setdefault(ty, []).append(tx)
+    rects = []
+    open_runs = {}
+    prev_ty = None
+    for ty in sorted(rows) + [None]:
+        runs = set()
+        if ty is not None:
+            xs = sorted(rows[ty])
+            start = xs[0]
+            for a, b in zip(xs, xs[1:]):
+                if b != a + 1:
+                    runs.add((start, a))
+                    start = b
+            runs.add((start, xs[-1]))
+        contiguous = ty is not None and prev_ty is not None and ty == prev_ty + 1
+        for run in list(open_runs):
+            if not contiguous or run not in runs:
+                rects.append((run[0], run[1], open_runs.pop(run), prev_ty))
+        for run in runs:
+            open_runs.setdefault(run, ty)
+        prev_ty = ty
+    return rects
+
+def _tile_range(xmin, xmax, ymin, ymax, zoom):
+    """(tx_min, tx_max, ty_min, ty_max) of the XYZ tiles covering an EPSG:4326 extent at one zoom."""
+    return (math.floor((xmin + 180) / 360 * 2 ** zoom), math.floor((xmax + 180) / 360 * 2 ** zoom),
+            math.floor(_lat_to_unit_y(ymax) * 2 ** zoom), math.floor(_lat_to_unit_y(ymin) * 2 ** zoom))
+
+def plan_tile_runs(layers, zoom_min, zoom_max):
+    """Split the render into (xmin, xmax, ymin, ymax, zoom_min, zoom_max) runs that only cover tiles
+    near the layers' features, instead of every tile in their bounding box."""
+    ext = QgsRectangle(layers[0].extent())
+    for layer in layers[1:]:
+        ext.combineExtentWith(layer.extent())
+    xmin, xmax, ymin, ymax = ext.xMinimum(), ext.xMaximum(), ext.yMinimum(), ext.yMaximum()
+    full = [(xmin, xmax, ymin, ymax, zoom_min, zoom_max)]
+    # Finest zoom whose grid over the bbox is still small enough to test cell by cell
+    grid_zoom = None
     for z in range(zoom_min, zoom_max + 1):
-        tile_x_min = math.floor((xmin + 180) / 360 * (2**z))
-        tile_x_max = math.floor((xmax + 180) / 360 * (2**z))
-        tile_y_min = lat_to_tile_y(ymax, z)
-        tile_y_max = lat_to_tile_y(ymin, z)
-        count = (tile_x_max - tile_x_min + 1) * (tile_y_max - tile_y_min + 1)
-        total += count
-    return total
+        if compute_total_tiles(xmin, xmax, ymin, ymax, z, z) > COVERAGE_MAX_CELLS:
+            break
+        grid_zoom = z
+    if grid_zoom is None:
+        return full
+    z = grid_zoom
+    tx_min, tx_max, ty_min, ty_max = _tile_range(xmin, xmax, ymin, ymax, z)
+    grid = {(tx, ty) for tx in range(tx_min, tx_max + 1) for ty in range(ty_min, ty_max + 1)}
+
+    # One index per layer: feature ids are only unique within a layer
+    indexes = [QgsSpatialIndex(layer.getFeatures(QgsFeatureRequest().setNoAttributes()), None,
+                               QgsSpatialIndex.FlagStoreFeatureGeometries) for layer in layers]
+    covered = set()
+    for tx, ty in grid:
+        cell = QgsRectangle(_tile_lon(tx, z), _tile_lat(ty + 1, z), _tile_lon(tx + 1, z), _tile_lat(ty, z))
+        if any(index.geometry(fid).intersects(cell) for index in indexes for fid in index.intersects(cell)):
+            covered.add((tx, ty))
+    # Labels can spill past a feature's edge: keep one cell of margin around covered cells
+    keep = {(tx + dx, ty + dy) for tx, ty in covered for dx in (-1, 0, 1) for dy in (-1, 0, 1)} & grid
+    if len(keep) == len(grid):
+        return full
+    rects = _merge_cells(keep)
+    if len(rects) > COVERAGE_MAX_RUNS:
+        return full
+
+    runs = []
+    if grid_zoom > zoom_min:
+        # Coarse zooms have few tiles and don't nest inside grid cells: render them over the bbox
+        runs.append((xmin, xmax, ymin, ymax, zoom_min, grid_zoom - 1))
+    # Pull each edge just inside its cell so neighbouring runs never claim the same tile
+    eps = 1e-9
+    for tx0, tx1, ty0, ty1 in rects:
+        runs.append((max(xmin, _tile_lon(tx0, z) + eps), min(xmax, _tile_lon(tx1 + 1, z) - eps),
+                     max(ymin, _tile_lat(ty1 + 1, z) + eps), min(ymax, _tile_lat(ty0, z) - eps),
+                     grid_zoom, zoom_max))
+    return runs
 
 class MinimalFeedback(QgsProcessingFeedback):
     def pushInfo(self, info): pass
@@ -134,16 +300,16 @@ class MinimalFeedback(QgsProcessingFeedback):
     def setProgress(self, progress): pass
 
 def clean_outline_layer(layer):
-    features = list(layer.getFeatures())
-    for feat in features:
+    # layer is a memory layer from processing: write through the provider in one batch,
+    # skipping the edit buffer and undo stack
+    provider = layer.dataProvider()
+    geom_updates = {}
+    for feat in layer.getFeatures(QgsFeatureRequest().setNoAttributes()):
         geom = feat.geometry()
         if not geom.isMultipart():
             poly = geom.asPolygon()
             if poly and len(poly) > 0:
-                new_geom = QgsGeometry.fromPolygonXY([poly[0]])
-                feat.setGeometry(new_geom)
-                with edit(layer):
-                    layer.changeGeometry(feat.id(), new_geom)
+                geom_updates[feat.id()] = QgsGeometry.fromPolygonXY([poly[0]])
         else:
             multi = geom.asMultiPolygon()
             if multi:
@@ -151,43 +317,87 @@ def clean_outline_layer(layer):
                 for poly in multi:
                     if poly and len(poly) > 0:
                         new_multi.append([poly[0]])
-                new_geom = QgsGeometry.fromMultiPolygonXY(new_multi)
-                feat.setGeometry(new_geom)
-                with edit(layer):
-                    layer.changeGeometry(feat.id(), new_geom)
+                geom_updates[feat.id()] = QgsGeometry.fromMultiPolygonXY(new_multi)
+    if geom_updates:
+        provider.changeGeometryValues(geom_updates)
+        layer.updateExtents()
     remove_ids = set()
-    features = list(layer.getFeatures())
-    for i, feat in enumerate(features):
-        geom_i = feat.geometry()
-        area_i = geom_i.area()
-        for j, other in enumerate(features):
-            if i == j:
-                continue
-            if feat["group_key"] != other["group_key"]:
-                continue
-            geom_j = other.geometry()
-            area_j = geom_j.area()
-            if geom_j.contains(geom_i) and area_j > area_i:
-                remove_ids.add(feat.id())
-                break
+    request = QgsFeatureRequest().setSubsetOfAttributes(["group_key"], layer.fields())
+    features = list(layer.getFeatures(request))
+    geoms = {}
+    areas = {}
+    keys = {}
+    bboxes = {}
+    for feat in features:
+        geoms[feat.id()] = feat.geometry()
+        areas[feat.id()] = geoms[feat.id()].area()
+        keys[feat.id()] = feat["group_key"]
+        bboxes[feat.id()] = geoms[feat.id()].boundingBox()
+    # Largest first: every outline that could contain the current one has already been visited,
+    # and the per-group index only ever holds those larger, kept outlines
+    group_index = {}
+    for fid_i in sorted(geoms, key=areas.get, reverse=True):
+        geom_i = geoms[fid_i]
+        bbox_i = bboxes[fid_i]
+        index = group_index.get(keys[fid_i])
+        if index is not None:
+            for fid_j in index.intersects(bbox_i):
+                # A container's bbox must hold ours: cheap rectangle test before the GEOS call
+                if areas[fid_j] > areas[fid_i] and bboxes[fid_j].contains(bbox_i) and geoms[fid_j].contains(geom_i):
+                    remove_ids.add(fid_i)
+                    break
+        if fid_i not in remove_ids:
+            # Removed outlines sit inside a kept one, which already covers anything they contain
+            if index is None:
+                index = group_index[keys[fid_i]] = QgsSpatialIndex()
+            index.addFeature(fid_i, bbox_i)
     if remove_ids:
-        with edit(layer):
-            for fid in remove_ids:
-                layer.deleteFeature(fid)
+        provider.deleteFeatures(list(remove_ids))
+        layer.updateExtents()
         return "Removed contained boundaries."
     else:
         return "No contained boundaries removed."
 
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+def png_may_be_transparent(data):
+    """False when the chunk headers show neither an alpha channel nor a tRNS chunk (no decode needed)."""
+    if data[:8] != _PNG_SIGNATURE or data[12:16] != b"IHDR" or len(data) < 26:
+        return True  # not something we can read cheaply: let PIL decide
+    if data[25] in (4, 6):  # IHDR colour type: grey+alpha, RGBA
+        return True
+    pos = 8
+    while pos + 8 <= len(data):
+        chunk_type = data[pos + 4:pos + 8]
+        if chunk_type == b"tRNS":
+            return True
+        if chunk_type == b"IDAT":  # tRNS has to precede the image data
+            return False
+        pos += 12 + int.from_bytes(data[pos:pos + 4], "big")
+    return True
+
+def is_blank_png(data):
+    if not png_may_be_transparent(data):
+        return False
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            if img.mode not in ("RGBA", "LA"):
+                img = img.convert("RGBA")
+            # Transparent tile <=> alpha is 0 everywhere; PIL gets the band's min/max in one C pass
+            return img.getchannel("A").getextrema() == (0, 0)
+    except Exception:
+        return False
+
 def is_blank_tile(tile_path):
     try:
-        with Image.open(tile_path) as img:
-            rgba_img = img.convert("RGBA")
-            blank = Image.new("RGBA", rgba_img.size, (0, 0, 0, 0))
-            diff = ImageChops.difference(rgba_img, blank)
-            return diff.getbbox() is None
+        with open(tile_path, "rb") as f:
+            return is_blank_png(f.read())
     except Exception:
         return False
 
+def blank_flags(datas):
+    return [is_blank_png(data) for data in datas]
+
 def process_tile(tile_path):
     try:
         if is_blank_tile(tile_path):
@@ -197,232 +407,522 @@ def process_tile(tile_path):
         return False
     return False
 
-def clean_tiles(directory, prefix=""):
-    tile_paths = []
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            if file.lower().endswith('.png'):
-                tile_paths.append(os.path.join(root, file))
-    total_tiles = len(tile_paths)
+def _can_use_process_pool():
+    """Pool workers re-import this script: only possible when it runs as a real file under python."""
+    main = sys.modules.get("__main__")
+    main_file = getattr(main, "__file__", None)
+    if not main_file or os.path.abspath(main_file) != os.path.abspath(__file__):
+        return False
+    return os.path.basename(sys.executable).lower().startswith("python")
+
+def _cleanup_pool_workers():
+    # Every worker process may be cleaning at the same time: share the cores between them
+    workers = max(1, (os.cpu_count() or 1) // WORKER_PROCESSES)
+    return workers if _can_use_process_pool() else min(32, workers + 4)
+
+_cleanup_pool = None
+
+def _get_cleanup_pool():
+    """Decode pool shared by every clean_tiles call in this process; shut down at exit."""
+    global _cleanup_pool
+    if _cleanup_pool is None:
+        if _can_use_process_pool():
+            # PNG decode is CPU-bound and holds the GIL: one process per core scales, threads don't
+            _cleanup_pool = concurrent.futures.ProcessPoolExecutor(max_workers=_cleanup_pool_workers())
+        else:
+            # QGIS console: pool workers can't re-import this script, so decode on threads
+            _cleanup_pool = concurrent.futures.ThreadPoolExecutor(max_workers=_cleanup_pool_workers())
+        atexit.register(_cleanup_pool.shutdown)
+    return _cleanup_pool
+
+def _read_stage(path_q, read_q):
+    while True:
+        tile_path = path_q.get()
+        if tile_path is None:
+            read_q.put(None)
+            return
+        try:
+            with open(tile_path, "rb") as f:
+                read_q.put((tile_path, f.read()))
+        except Exception:
+            pass
+
+def _unlink_stage(unlink_q, removed):
+    while True:
+        tile_path = unlink_q.get()
+        if tile_path is None:
+            return
+        try:
+            os.remove(tile_path)
+            removed.append(tile_path)
+        except Exception:
+            pass
+
+def clean_tiles_pipeline(tile_paths, decode_executor, max_in_flight):
+    """Read (threads) -> decode/check (decode_executor) -> unlink (threads), joined by bounded queues.
+
+    Slow reads or deletes on a network share no longer leave the decoders idle, and vice versa.
+    Returns the number of tiles deleted.
+    """
+    path_q = queue.Queue()
+    for tile_path in tile_paths:
+        path_q.put(tile_path)
+    for _ in range(CLEANUP_READ_THREADS):
+        path_q.put(None)
+    read_q = queue.Queue(maxsize=CLEANUP_QUEUE_SIZE)
+    unlink_q = queue.Queue(maxsize=CLEANUP_QUEUE_SIZE)
+    done_q = queue.SimpleQueue()
+    removed = []
+    readers = [threading.Thread(target=_read_stage, args=(path_q, read_q), daemon=True)
+               for _ in range(CLEANUP_READ_THREADS)]
+    unlinkers = [threading.Thread(target=_unlink_stage, args=(unlink_q, removed), daemon=True)
+                 for _ in range(CLEANUP_UNLINK_THREADS)]
+    for t in readers + unlinkers:
+        t.start()
+
+    batch_paths, batch_datas = [], []
+    in_flight = 0
+    # Tiles read but not yet decided; must be back to 0 once the decoders are drained
+    undecided = 0
+
+    def submit_batch():
+        nonlocal batch_paths, batch_datas, in_flight
+        # Batches keep the per-task IPC cost down when decoding in a process pool
+        future = decode_executor.submit(blank_flags, batch_datas)
+        future.add_done_callback(lambda f, paths=batch_paths: done_q.put((paths, f)))
+        in_flight += 1
+        batch_paths, batch_datas = [], []
+
+    def forward_results(block):
+        nonlocal in_flight, undecided
+        while in_flight:
+            try:
+                paths, future = done_q.get(block=block)
+            except queue.Empty:
+                return
+            in_flight -= 1
+            undecided -= len(paths)
+            block = False
+            try:
+                flags = future.result()
+            except Exception:
+                continue
+            for tile_path, blank in zip(paths, flags):
+                if blank:
+                    unlink_q.put(tile_path)
+
+    readers_left = CLEANUP_READ_THREADS
+    while readers_left:
+        item = read_q.get()
+        if item is None:
+            readers_left -= 1
+        else:
+            batch_paths.append(item[0])
+            batch_datas.append(item[1])
+            undecided += 1
+            if len(batch_paths) >= CLEANUP_DECODE_BATCH:
+                submit_batch()
+        # Only wait on the decoders when enough work is already queued for them
+        forward_results(block=in_flight >= max_in_flight)
+    if batch_paths:
+        submit_batch()
+    # forward_results stops blocking after one result: keep waiting until every batch is back
+    while in_flight:
+        forward_results(block=True)
+    if undecided:
+        raise RuntimeError(f"Tile cleanup lost track of {undecided} tiles.")
+
+    for _ in unlinkers:
+        unlink_q.put(None)
+    for t in unlinkers:
+        t.join()
+    return len(removed)
+
+def _run_tile_paths(directory, tile_runs):
+    for xmin, xmax, ymin, ymax, zoom_min, zoom_max in tile_runs:
+        for z in range(zoom_min, zoom_max + 1):
+            tx_min, tx_max, ty_min, ty_max = _tile_range(xmin, xmax, ymin, ymax, z)
+            for x in range(tx_min, tx_max + 1):
+                column = os.path.join(directory, str(z), str(x))
+                for y in range(ty_min, ty_max + 1):
+                    yield os.path.join(column, f"{y}.png")
+
+def clean_tiles(directory, prefix="", tile_runs=None):
+    if tile_runs is None:
+        tile_paths = []
+        for root, dirs, files in os.walk(directory):
+            for file in files:
+                if file.lower().endswith('.png'):
+                    tile_paths.append(os.path.join(root, file))
+        total_tiles = len(tile_paths)
+        found = f"{total_tiles} PNG files found"
+    else:
+        # The render's own runs say which z/x/y files exist: no directory walk, and
+        # tiles that turn out to be missing are simply skipped by the readers
+        tile_paths = _run_tile_paths(directory, tile_runs)
+        total_tiles = sum(compute_total_tiles(*run) for run in tile_runs)
+        found = f"{total_tiles} tiles planned"
     if total_tiles == 0:
         print(f"{prefix}No PNG tiles found to process.")
         return
-    print(f"{prefix}Tile cleanup started: {total_tiles} PNG files found.")
-    removed_files = 0
-    max_workers = min(64, os.cpu_count() * 4)
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [executor.submit(process_tile, tile_path) for tile_path in tile_paths]
-        for future in concurrent.futures.as_completed(futures):
-            try:
-                if future.result():
-                    removed_files += 1
-            except Exception:
-                pass
+    print(f"{prefix}Tile cleanup started: {found}.")
+    if total_tiles <= SEQUENTIAL_CLEANUP_MAX_TILES:
+        # Too few tiles to pay for the pipeline
+        removed_files = sum(1 for tile_path in tile_paths if process_tile(tile_path))
+    else:
+        removed_files = clean_tiles_pipeline(tile_paths, _get_cleanup_pool(), _cleanup_pool_workers() * 2)
     print(f"{prefix}Tile cleanup done. {removed_files} blank tiles deleted.")
 
-def get_group_key(feat):
-    def safe_val(field):
-        return feat[field] if field in feat.fields().names() else None
+GROUP_KEY_SOURCE_FIELDS = ("Type", "M", "MN", "B", "K")
 
-    t = str(safe_val("Type")).strip() if safe_val("Type") is not None else ""
-    m_val = safe_val("M")
-    mn_val = safe_val("MN")
-    b_val = safe_val("B")
-    k_val = safe_val("K")
+# Values that count as "no value" (after _norm these reduce to None and 0)
+_BLANK_VALUES = frozenset((None, "", "None", 0, "0"))
 
-    # Helper to normalize values
-    def norm(x):
-        if x in [None, "", "None"]:
-            return None
-        try:
-            if isinstance(x, str) and x.isdigit():
-                return int(x)
-            return x
-        except Exception:
-            return x
+def _norm(x):
+    # NULL attributes can arrive as QVariant, which isn't hashable: fold them to None
+    if x is None or isinstance(x, QVariant) or x == "" or x == "None":
+        return None
+    if isinstance(x, str) and x.isdigit():
+        return int(x)
+    return x
+
+def _has_value(x):
+    try:
+        return x not in _BLANK_VALUES
+    except TypeError:  # unhashable, e.g. a JSON array
+        return True
+
+def get_group_key(attrs, src_idx):
+    # src_idx maps field name -> attribute index, resolved once per layer; each branch
+    # only reads and normalises the fields it needs
+    def value(field):
+        idx = src_idx.get(field)
+        return _norm(attrs[idx]) if idx is not None else None
 
-    m_norm = norm(m_val)
-    mn_norm = norm(mn_val)
-    b_norm = norm(b_val)
-    k_norm = norm(k_val)
+    idx = src_idx.get("Type")
+    t = str(attrs[idx]).strip() if idx is not None and attrs[idx] is not None else ""
 
     if t == "MT":
+        m_val = value("M")
+        mn_val = value("MN")
+        has_m = _has_value(m_val)
+        has_mn = _has_value(mn_val)
         # Both M and MN are blank/zero
-        if (m_norm is None or m_norm == 0) and (mn_norm is None or mn_norm == 0):
+        if not has_m and not has_mn:
             return "0"
         # Only one of M or MN has value, use that value
-        if (m_norm is not None and m_norm != 0) and (mn_norm is None or mn_norm == 0):
-            return str(m_norm)
-        if (mn_norm is not None and mn_norm != 0) and (m_norm is None or m_norm == 0):
-            return str(mn_norm)
+        if not has_mn:
+            return str(m_val)
+        if not has_m:
+            return str(mn_val)
         # Both have value and are equal, use M
-        if (m_norm is not None and mn_norm is not None) and (m_norm == mn_norm):
-            return str(m_norm)
+        if m_val == mn_val:
+            return str(m_val)
         # Both present and different, use B/MN if possible, else MN
-        if mn_norm not in [None, 0]:
-            if b_norm in [None, "", "None", 0, "0"]:
-                return str(mn_norm)
-            else:
-                return f"{b_norm}/{mn_norm}"
-        if m_norm not in [None, 0]:
-            return str(m_norm)
-        return "0"
-    elif t in ("MU", "MU/MT", "MT/MU", "MU/KW", "KW"):
-        if m_norm not in [None, 0]:
-            return str(m_norm)
-    elif t == "K":
-        if k_norm not in [None, 0]:
-            return str(k_norm)
-    # Fallback to M
-    if m_norm not in [None, 0]:
-        return str(m_norm)
-    return "0"
-
-
-def process_geojson(geojson_file):
-    try:
-        base_name = os.path.splitext(os.path.basename(geojson_file))[0]
-        print(f"Processing: {base_name}")
-        layer = QgsVectorLayer(geojson_file, base_name, "ogr")
-        if not layer.isValid():
-            print(f"Layer failed to load. Skipping.")
-            return
+        b_val = value("B")
+        return f"{b_val}/{mn_val}" if _has_value(b_val) else str(mn_val)
+    if t == "K":
+        k_val = value("K")
+        if _has_value(k_val):
+            return str(k_val)
+    # MU-like types and everything else: M, else "0"
+    m_val = value("M")
+    return str(m_val) if _has_value(m_val) else "0"
+
+def _job_output_dir(geojson_file):
+    base_name = os.path.splitext(os.path.basename(geojson_file))[0]
+    return os.path.join(os.path.dirname(geojson_file), base_name)
+
+def load_job_layers(geojson_file):
+    """Load a GeoJSON as a styled memory layer plus its cleaned outline layer.
+    Returns [memory layer, outline layer if any], or None if the job can't be rendered."""
+    base_name = os.path.splitext(os.path.basename(geojson_file))[0]
+    print(f"Processing: {base_name}")
+    layer = QgsVectorLayer(geojson_file, base_name, "ogr")
+    if not layer.isValid():
+        print(f"Layer failed to load. Skipping.")
+        return None
 
-        geom_type = QgsWkbTypes.displayString(layer.wkbType()).lower()
-        crs_authid = layer.crs().authid()
-        mem_layer = QgsVectorLayer(f"{geom_type}?crs={crs_authid}", base_name, "memory")
-        mem_provider = mem_layer.dataProvider()
-        fields = layer.fields()
-        if "group_key" not in fields.names():
-            fields.append(QgsField("group_key", QVariant.String))
-        mem_provider.addAttributes(fields)
+    # Copy into memory on the C++ side; group_key is added to the copy (writing it through the
+    # OGR provider would rewrite the source GeoJSON), and only geometries needing repair are touched
+    mem_layer = layer.materialize(QgsFeatureRequest())
+    del layer
+    mem_provider = mem_layer.dataProvider()
+    if mem_layer.fields().indexFromName("group_key") == -1:
+        mem_provider.addAttributes([QgsField("group_key", QVariant.String)])
         mem_layer.updateFields()
 
-        new_features = []
-        for feat in layer.getFeatures():
-            geom = feat.geometry()
-            if not geom.isGeosValid():
-                geom = geom.makeValid()
-            new_feat = QgsFeature(mem_layer.fields())
-            new_feat.setGeometry(geom)
-            attrs = list(feat.attributes())
-            if len(attrs) < mem_layer.fields().count():
-                attrs += [None] * (mem_layer.fields().count() - len(attrs))
-            group_key = get_group_key(feat)
-            group_key_idx = mem_layer.fields().indexFromName("group_key")
-            attrs[group_key_idx] = group_key
-            new_feat.setAttributes(attrs)
-            new_features.append(new_feat)
-        mem_provider.addFeatures(new_features)
-        mem_layer.updateExtents()
-        layer = mem_layer
-        print(f"Memory layer created.")
-
-        QgsProject.instance().addMapLayer(layer)
+    mem_fields = mem_layer.fields()
+    src_idx = {name: mem_fields.indexFromName(name)
+               for name in GROUP_KEY_SOURCE_FIELDS if mem_fields.indexFromName(name) != -1}
+    group_key_idx = mem_fields.indexFromName("group_key")
+    key_updates = {}
+    geom_updates = {}
+    request = QgsFeatureRequest().setSubsetOfAttributes(list(src_idx.values()))
+    for feat in mem_layer.getFeatures(request):
+        key_updates[feat.id()] = {group_key_idx: get_group_key(feat.attributes(), src_idx)}
+        geom = feat.geometry()
+        if not geom.isGeosValid():
+            geom_updates[feat.id()] = geom.makeValid()
+    mem_provider.changeAttributeValues(key_updates)
+    if geom_updates:
+        mem_provider.changeGeometryValues(geom_updates)
+    mem_layer.updateExtents()
+    layer = mem_layer
+    print(f"Memory layer created.")
+
+    try:
+        tile_style_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tile_style.qml")
+        if os.path.exists(tile_style_path):
+            layer.loadNamedStyle(tile_style_path)
+    except Exception:
+        print("Could not apply tile_style.qml.")
+    layer.setLabelsEnabled(True)
+
+    outline_layer = None
+    fields_present = layer.fields().names()
+    if "M" not in fields_present or "Type" not in fields_present:
+        print(f"Layer missing M or Type field.")
+    else:
+        if layer.fields().indexFromName("group_key") == -1:
+            print("group_key field missing.")
+            return None
+        dissolved = processing.run(
+            "native:dissolve",
+            {"INPUT": layer, "FIELD": ["group_key"], "OUTPUT": "memory:"},
+            feedback=MinimalFeedback())["OUTPUT"]
+        outline_layer = processing.run(
+            "native:multiparttosingleparts",
+            {"INPUT": dissolved, "OUTPUT": "memory:"},
+            feedback=MinimalFeedback())["OUTPUT"]
+        clean_msg = clean_outline_layer(outline_layer)
+        print(f"Outline cleaned. {clean_msg}")
         try:
-            tile_style_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tile_style.qml")
-            if os.path.exists(tile_style_path):
-                layer.loadNamedStyle(tile_style_path)
+            murabb_style_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "murabb_style.qml")
+            if os.path.exists(murabb_style_path):
+                outline_layer.loadNamedStyle(murabb_style_path)
         except Exception:
-            print("Could not apply tile_style.qml.")
-        layer.setLabelsEnabled(True)
-        layer.triggerRepaint()
-        QApplication.processEvents()
-
-        outline_layer = None
-        fields_present = layer.fields().names()
-        if "M" not in fields_present or "Type" not in fields_present:
-            print(f"Layer missing M or Type field.")
-        else:
-            if layer.fields().indexFromName("group_key") == -1:
-                print("group_key field missing.")
-                return
-            dissolved = processing.run(
-                "native:dissolve",
-                {"INPUT": layer, "FIELD": ["group_key"], "OUTPUT": "memory:"},
-                feedback=MinimalFeedback())["OUTPUT"]
-            outline_layer = processing.run(
-                "native:multiparttosingleparts",
-                {"INPUT": dissolved, "OUTPUT": "memory:"},
-                feedback=MinimalFeedback())["OUTPUT"]
-            clean_msg = clean_outline_layer(outline_layer)
-            print(f"Outline cleaned. {clean_msg}")
-            QgsProject.instance().addMapLayer(outline_layer)
+            print("Could not apply murabb_style.qml.")
+
+        # Label
+        lab = outline_layer.labeling().settings()
+        lab.fieldName = '"group_key"'
+        lab.isExpression = True
+        outline_layer.setLabeling(QgsVectorLayerSimpleLabeling(lab))
+        outline_layer.setLabelsEnabled(True)
+
+    return [layer, outline_layer] if outline_layer is not None else [layer]
+
+@functools.lru_cache(maxsize=None)
+def _tile_algorithm():
+    """(algorithm id, takes LAYERS). processing.run ignores undeclared parameters, so only an
+    algorithm that declares LAYERS renders layers it is given; otherwise the project is rendered."""
+    registry = QgsApplication.processingRegistry()
+    for alg_id in ("native:tilesxyzdirectory", "qgis:tilesxyzdirectory"):
+        alg = registry.algorithmById(alg_id)
+        if alg is not None and alg.parameterDefinition("LAYERS") is not None:
+            return alg_id, True
+    return "native:tilesxyzdirectory", False
+
+def render_tiles(layers, output_dir, label, project_layer_ids):
+    """Render `layers` to XYZ tiles over the areas they cover; returns the runs used.
+    Layers that had to be registered with the project are appended to project_layer_ids."""
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    tile_runs = plan_tile_runs(layers, 10, 20)
+    total_tiles = sum(compute_total_tiles(*run) for run in tile_runs)
+    ext = QgsRectangle(layers[0].extent())
+    for layer in layers[1:]:
+        ext.combineExtentWith(layer.extent())
+    bbox_tiles = compute_total_tiles(ext.xMinimum(), ext.xMaximum(), ext.yMinimum(), ext.yMaximum(), 10, 20)
+    print(f"Tiles to generate: {total_tiles} (bounding box: {bbox_tiles}, {len(tile_runs)} render(s))")
+    params = {
+        'DPI': 75,
+        'BACKGROUND_COLOR': 'rgba(0, 0, 0, 0.00)',
+        'ANTIALIAS': True,
+        'TILE_FORMAT': 0,
+        'QUALITY': 75,
+        'METATILESIZE': 16,
+        'TILE_WIDTH': 256,
+        'TILE_HEIGHT': 256,
+        'TMS_CONVENTION': False,
+        'HTML_TITLE': '',
+        'HTML_ATTRIBUTION': '',
+        'HTML_OSM': False,
+        'OUTPUT_DIRECTORY': output_dir.replace("\\", "/")
+    }
+    alg_id, takes_layers = _tile_algorithm()
+    if takes_layers:
+        params['LAYERS'] = layers
+    else:
+        # The algorithm renders the project's layer tree: the layers have to be registered
+        for lyr in layers:
+            QgsProject.instance().addMapLayer(lyr)
+            project_layer_ids.append(lyr.id())
+    for xmin, xmax, ymin, ymax, zoom_min, zoom_max in tile_runs:
+        params['EXTENT'] = f"{xmin},{xmax},{ymin},{ymax} [EPSG:4326]"
+        params['ZOOM_MIN'] = zoom_min
+        params['ZOOM_MAX'] = zoom_max
+        processing.run(alg_id, params, feedback=MinimalFeedback())
+    print(f"Tiles generated for '{label}'.")
+    return tile_runs
+
+def split_batch_tiles(shared_dir, jobs):
+    """Hand each (geojson_file, layers) job the batch tiles inside its own bounding box."""
+    for z_entry in os.scandir(shared_dir):
+        if not z_entry.is_dir() or not z_entry.name.isdigit():
+            continue
+        job_ranges = []
+        for geojson_file, layers in jobs:
+            ext = layers[0].extent()
+            job_ranges.append((_job_output_dir(geojson_file),) + _tile_range(
+                ext.xMinimum(), ext.xMaximum(), ext.yMinimum(), ext.yMaximum(), int(z_entry.name)))
+        for x_entry in os.scandir(z_entry.path):
+            if not x_entry.is_dir() or not x_entry.name.isdigit():
+                continue
+            x = int(x_entry.name)
+            targets = [r for r in job_ranges if r[1] <= x <= r[2]]
+            if not targets:
+                continue
+            for tile in os.scandir(x_entry.path):
+                if not tile.name.endswith(".png") or not tile.name[:-4].isdigit():
+                    continue
+                y = int(tile.name[:-4])
+                for out_dir, _, _, ty_min, ty_max in targets:
+                    if not ty_min <= y <= ty_max:
+                        continue
+                    dest_dir = os.path.join(out_dir, z_entry.name, x_entry.name)
+                    os.makedirs(dest_dir, exist_ok=True)
+                    dest = os.path.join(dest_dir, tile.name)
+                    try:
+                        # Same volume: a hard link shares the tile instead of copying it
+                        os.link(tile.path, dest)
+                    except OSError:
+                        shutil.copy2(tile.path, dest)
+
+def process_geojson(geojson_files):
+    """Process a batch of GeoJSON jobs; with more than one, render them together and split the tiles."""
+    project_layer_ids = []
+    try:
+        jobs = []
+        for geojson_file in geojson_files:
             try:
-                murabb_style_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "murabb_style.qml")
-                if os.path.exists(murabb_style_path):
-                    outline_layer.loadNamedStyle(murabb_style_path)
+                layers = load_job_layers(geojson_file)
             except Exception:
-                print("Could not apply murabb_style.qml.")
-            outline_layer.triggerRepaint()
-
-            # Label
-            lab = outline_layer.labeling().settings()
-            lab.fieldName = '"group_key"'
-            lab.isExpression = True
-            outline_layer.setLabeling(QgsVectorLayerSimpleLabeling(lab))
-            outline_layer.setLabelsEnabled(True)
-            outline_layer.triggerRepaint()
-
-        output_dir = os.path.join(os.path.dirname(geojson_file), base_name)
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-
-        total_tiles = compute_total_tiles(layer.extent().xMinimum(), layer.extent().xMaximum(),
-                                         layer.extent().yMinimum(), layer.extent().yMaximum(),
-                                         10, 20)
-        print(f"Tiles to generate: {total_tiles}")
-        params = {
-            'EXTENT': f"{layer.extent().xMinimum()},{layer.extent().xMaximum()},{layer.extent().yMinimum()},{layer.extent().yMaximum()} [EPSG:4326]",
-            'ZOOM_MIN': 10,
-            'ZOOM_MAX': 20,
-            'DPI': 75,
-            'BACKGROUND_COLOR': 'rgba(0, 0, 0, 0.00)',
-            'ANTIALIAS': True,
-            'TILE_FORMAT': 0,
-            'QUALITY': 75,
-            'METATILESIZE': 16,
-            'TILE_WIDTH': 256,
-            'TILE_HEIGHT': 256,
-            'TMS_CONVENTION': False,
-            'HTML_TITLE': '',
-            'HTML_ATTRIBUTION': '',
-            'HTML_OSM': False,
-            'OUTPUT_DIRECTORY': output_dir.replace("\\", "/")
-        }
-        processing.run("native:tilesxyzdirectory", params, feedback=MinimalFeedback())
-        print(f"Tiles generated for '{base_name}'.")
-        clean_tiles(output_dir, prefix=f"{base_name}: ")
+                print(f"Error processing {geojson_file}")
+                continue
+            if layers is not None:
+                jobs.append((geojson_file, layers))
+        if len(jobs) == 1:
+            geojson_file, layers = jobs[0]
+            base_name = os.path.splitext(os.path.basename(geojson_file))[0]
+            output_dir = _job_output_dir(geojson_file)
+            tile_runs = render_tiles(layers, output_dir, base_name, project_layer_ids)
+            clean_tiles(output_dir, prefix=f"{base_name}: ", tile_runs=tile_runs)
+        elif jobs:
+            label = ", ".join(os.path.splitext(os.path.basename(f))[0] for f, _ in jobs)
+            shared_dir = tempfile.mkdtemp(prefix="batch_", dir=os.path.dirname(jobs[0][0]))
+            try:
+                tile_runs = render_tiles([lyr for _, layers in jobs for lyr in layers], shared_dir, label,
+                                         project_layer_ids)
+                # Blank tiles are dropped once here rather than once per job
+                clean_tiles(shared_dir, prefix=f"{label}: ", tile_runs=tile_runs)
+                split_batch_tiles(shared_dir, jobs)
+            finally:
+                shutil.rmtree(shared_dir, ignore_errors=True)
 
     except Exception as e:
-        print(f"Error processing {geojson_file}")
+        print(f"Error processing {', '.join(geojson_files)}")
     finally:
-        try:
-            for l in list(QgsProject.instance().mapLayers().values()):
-                QgsProject.instance().removeMapLayer(l.id())
-        except Exception:
-            pass
-        QApplication.processEvents()
-        gc.collect()
-        time.sleep(2)
+        if project_layer_ids:
+            try:
+                # Only what this job registered; layers and providers are released here
+                QgsProject.instance().removeMapLayers(project_layer_ids)
+            except Exception:
+                pass
+            QApplication.processEvents()
+
+# ========== WORKER PROCESSES ==========
+def _worker_python():
+    """Interpreter for worker processes (inside QGIS, sys.executable is the QGIS binary)."""
+    exe = os.path.basename(sys.executable).lower()
+    if exe.startswith("python"):
+        return sys.executable
+    if os.name == "nt":
+        return os.path.join(sys.exec_prefix, "python.exe")
+    return os.path.join(sys.exec_prefix, "bin", "python3")
+
+def _worker_env():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in sys.path if p)
+    env.setdefault("QGIS_PREFIX_PATH", QgsApplication.prefixPath())
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    return env
+
+def launch_workers(main_folder, count):
+    """Start `count` headless workers that share this folder's job list."""
+    if count <= 0:
+        return []
+    env = _worker_env()
+    script = os.path.abspath(__file__)
+    procs = []
+    for _ in range(count):
+        procs.append(subprocess.Popen([_worker_python(), script, "--worker", main_folder], env=env))
+    print(f"Started {len(procs)} worker process(es).")
+    return procs
+
+def worker_main(main_folder):
+    """Entry point for a launched worker: boot QGIS headless and drain the job list."""
+    QgsApplication.setPrefixPath(os.environ.get("QGIS_PREFIX_PATH", ""), True)
+    qgs = QgsApplication([], False)
+    qgs.initQgis()
+    from processing.core.Processing import Processing
+    Processing.initialize()
+    try:
+        process_jobs(main_folder)
+    finally:
+        qgs.exitQgis()
 
 # ========== MAIN LOOP ==========
+def process_jobs(main_folder):
+    while True:
+        if BATCH_RENDER_JOBS:
+            batch = claim_job_batch(main_folder)
+        else:
+            geojson_file = claim_next_job(main_folder)
+            batch = [geojson_file] if geojson_file is not None else []
+        if not batch:
+            # Only scan for completion when there was nothing left to claim
+            if check_all_done(main_folder):
+                break
+            print("Waiting for jobs...")
+            time.sleep(5)
+            continue
+        print(f"\nClaimed: {', '.join(os.path.basename(f) for f in batch)}")
+        process_geojson(batch)
+        for geojson_file in batch:
+            mark_job_done(main_folder, geojson_file)
+
+def run():
+    main_folder = select_main_folder()
+    if not main_folder:
+        print("No folder selected. Exiting.")
+        return
 
-main_folder = select_main_folder()
-if not main_folder:
-    print("No folder selected. Exiting.")
-else:
     print(f"Selected folder: {main_folder}")
-
     build_job_list(main_folder)
 
-    while not check_all_done(main_folder):
-        geojson_file = claim_next_job(main_folder)
-        if geojson_file is None:
-            print("Waiting for jobs...")
-            time.sleep(5)
-            continue
-        print(f"\nClaimed: {os.path.basename(geojson_file)}")
-        process_geojson(geojson_file)
-        mark_job_done(main_folder, geojson_file)
+    # This process is one of the workers; claims are atomic renames, so they can't collide
+    workers = launch_workers(main_folder, WORKER_PROCESSES - 1)
+    process_jobs(main_folder)
+    for proc in workers:
+        proc.wait()
+
     print("All GeoJSON files processed.")
+
+if __name__ in {"__main__", "__console__"}:
+    if "--worker" in sys.argv:
+        worker_main(sys.argv[-1])
+    else:
+        run()